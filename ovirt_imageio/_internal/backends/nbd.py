@@ -64,6 +64,9 @@ class Backend:
         self._position = 0
         self._dirty = False
         self._max_connections = max_connections
+        # Extents cached per context. Used only when the backend is read only
+        # since other connections may modify the image.
+        self._extents = {}
 
     def clone(self):
         """
@@ -74,7 +77,7 @@ class Backend:
             export_name=self._client.export_name,
             dirty=self._client.dirty)
         try:
-            return self.__class__(
+            backend = self.__class__(
                 client,
                 mode=self._mode,
                 max_connections=self._max_connections)
@@ -82,6 +85,12 @@ class Backend:
             client.close()
             raise
 
+        # Copy extents to save expensive BLOCK_STATUS calls.
+        for ctx in list(self._extents):
+            backend._extents[ctx] = self._extents[ctx].copy()
+
+        return backend
+
     @property
     def max_readers(self):
         return self._max_connections
@@ -177,6 +186,21 @@ class Backend:
                 "NBD export {!r} does not support dirty extents"
                 .format(self._client.export_name))
 
+        # A read only backend is used for downloading an image which is not
+        # modified during the download, so we can cache the extents. Writable
+        # backends must query the server since the image may change.
+        if self.writable():
+            for ext in self._get_extents(context):
+                yield ext
+            return
+
+        if context not in self._extents:
+            self._extents[context] = list(self._get_extents(context))
+
+        for ext in self._extents[context]:
+            yield ext
+
+    def _get_extents(self, context):
         dirty = context == "dirty"
         start = 0
         for ext in nbdutil.extents(self._client, dirty=dirty):
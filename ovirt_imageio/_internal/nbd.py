@@ -436,8 +436,7 @@ class Client:
 
     def write(self, offset, data):
         cmd = Write(self._next_handle(), offset, len(data))
-        self._send_command(cmd)
-        self._send(data)
+        self._send_command(cmd, data)
         self._recv_reply(cmd)
 
     def zero(self, offset, length, punch_hole=True):
@@ -835,9 +834,7 @@ class Client:
         """
         log.debug("Sending option: %r data: %r", opt, data)
         b = OPTION.pack(IHAVEOPT, opt, len(data))
-        self._send(b)
-        if data:
-            self._send(data)
+        self._sendmsg(b, data)
 
     def _recv_option_reply(self, expected_option):
         """
@@ -943,9 +940,13 @@ class Client:
     def _next_handle(self):
         return next(self._counter)
 
-    def _send_command(self, cmd):
+    def _send_command(self, cmd, payload=None):
         log.debug("Sending %s", cmd)
-        self._send(cmd.to_bytes())
+        if payload is None:
+            self._send(cmd.to_bytes())
+        else:
+            # Send the request header and the payload in the same syscall.
+            self._sendmsg(cmd.to_bytes(), payload)
 
     def _recv_reply(self, cmd):
         """
@@ -1222,6 +1223,21 @@ class Client:
     def _send(self, data):
         self._sock.sendall(data)
 
+    def _sendmsg(self, *buffers):
+        """
+        Send all buffers using vectored I/O, like sendall() for multiple
+        buffers, without copying the buffers.
+        """
+        views = [memoryview(buf).cast("B") for buf in buffers]
+        while views:
+            n = self._sock.sendmsg(views)
+            # Drop buffers sent completely, and the sent part of a buffer
+            # sent partly.
+            while views and n >= len(views[0]):
+                n -= len(views.pop(0))
+            if n:
+                views[0] = views[0][n:]
+
     def _recv(self, length):
         buf = bytearray(length)
         self._recv_into(buf)
@@ -7,8 +7,6 @@ import os
 import subprocess
 import urllib.parse
 
-from contextlib import closing
-
 import pytest
 import userstorage
 
@@ -56,7 +54,7 @@ def test_open_read_only(user_file):
     with io.open(user_file.path, "wb") as f:
         f.write(b"x" * user_file.sector_size)
     with file.open(user_file.url) as f, \
-            closing(util.aligned_buffer(user_file.sector_size)) as buf:
+            util.aligned_buffer(user_file.sector_size) as buf:
         assert f.readable()
         assert not f.writable()
         f.readinto(buf)
@@ -67,7 +65,7 @@ def test_open_read_write(user_file):
     with io.open(user_file.path, "wb") as f:
         f.write(b"a" * user_file.sector_size)
     with file.open(user_file.url, "r+") as f, \
-            closing(util.aligned_buffer(user_file.sector_size)) as buf:
+            util.aligned_buffer(user_file.sector_size) as buf:
         assert f.readable()
         assert f.writable()
         f.readinto(buf)
@@ -97,7 +95,7 @@ def test_close(tmpurl):
     # But other oprations should fail.
     error = "Operation on closed backend"
 
-    with closing(util.aligned_buffer(4096)) as buf:
+    with util.aligned_buffer(4096) as buf:
         with pytest.raises(ValueError) as e:
             b.write(buf)
         assert str(e.value) == error
@@ -179,7 +177,7 @@ def test_readinto(user_file):
     with io.open(user_file.path, "wb") as f:
         f.write(b"a" * 4096)
     with file.open(user_file.url) as f, \
-            closing(util.aligned_buffer(4096)) as buf:
+            util.aligned_buffer(4096) as buf:
         n = f.readinto(buf)
         assert n == len(buf)
         assert f.tell() == len(buf)
@@ -194,7 +192,7 @@ def test_readinto_short_aligned(user_file):
         f.write(b"a" * size)
 
     with file.open(user_file.url) as f, \
-            closing(util.aligned_buffer(buf_size)) as buf:
+            util.aligned_buffer(buf_size) as buf:
         n = f.readinto(buf)
         assert n == size
         assert f.tell() == size
@@ -210,7 +208,7 @@ def test_readinto_short_unaligned(user_file):
         f.write(b"a" * size)
 
     with file.open(user_file.url) as f, \
-            closing(util.aligned_buffer(buf_size)) as buf:
+            util.aligned_buffer(buf_size) as buf:
         n = f.readinto(buf)
         assert n == size
         assert f.tell() == size
@@ -222,7 +220,7 @@ def test_write_aligned_middle(user_file):
     with io.open(user_file.path, "wb") as f:
         f.write(b"a" * 4 * 4096)
     with file.open(user_file.url, "r+") as f, \
-            closing(util.aligned_buffer(8192)) as buf:
+            util.aligned_buffer(8192) as buf:
         buf.write(b"b" * 8192)
         f.seek(4096)
         n = f.write(buf)
@@ -238,7 +236,7 @@ def test_write_aligned_at_end(user_file):
     with io.open(user_file.path, "wb") as f:
         f.write(b"a" * 8192)
     with file.open(user_file.url, "r+") as f, \
-            closing(util.aligned_buffer(8192)) as buf:
+            util.aligned_buffer(8192) as buf:
         buf.write(b"b" * 8192)
         f.seek(4096)
         n = f.write(buf)
@@ -253,7 +251,7 @@ def test_write_aligned_after_end(user_file):
     with io.open(user_file.path, "wb") as f:
         f.write(b"a" * 4096)
     with file.open(user_file.url, "r+") as f, \
-            closing(util.aligned_buffer(8192)) as buf:
+            util.aligned_buffer(8192) as buf:
         buf.write(b"b" * 8192)
         f.seek(8192)
         n = f.write(buf)
@@ -376,7 +374,7 @@ def test_write_unaligned_buffer_fast_path(user_file):
     buf.write(b"y" * len(buf))
 
     # Perform short fast write of 2 blocks.
-    with closing(buf):
+    with buf:
         with file.open(user_file.url, "r+") as f:
             f.seek(start)
             n = f.write(buf)
@@ -593,7 +591,7 @@ def test_dirty(user_file):
     with file.open(user_file.url, "r+", sparse=True) as f:
         assert not f.dirty
         buf = util.aligned_buffer(4096)
-        with closing(buf):
+        with buf:
             # write ans zero dirty the backend
             buf.write(b"x" * 4096)
             f.write(buf)
@@ -2,28 +2,43 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 
 import os
-from contextlib import closing
 
 import pytest
 import userstorage
 
 from ovirt_imageio._internal import errors
 from ovirt_imageio._internal import extent
-from ovirt_imageio._internal import qemu_img
-from ovirt_imageio._internal import util
+from ovirt_imageio._internal import ioutil
+from ovirt_imageio._internal import qemu_nbd
 from ovirt_imageio._internal.backends import nbd
+from ovirt_imageio._internal.nbd import UnixAddress
 
 from .. import storage
+from .. import testutil
 
 BACKENDS = userstorage.load_config("storage.py").BACKENDS
 
+SHARED_IMAGE_SIZE = 150 * 1024**2
+
+DATA_100 = b"x" * 100
+DATA_4K = b"x" * 4096
+DATA_64K = b"x" * 64 * 1024
+
+
+def user_storage(name):
+    """
+    Tests using the same user storage share the same file, so they must run
+    in the same worker when running tests in parallel with pytest-xdist.
+    """
+    return pytest.param(BACKENDS[name], marks=pytest.mark.xdist_group(name))
+
 
 @pytest.fixture(
     params=[
-        BACKENDS["file-512-ext4"],
-        BACKENDS["file-512-xfs"],
-        BACKENDS["file-4k-ext4"],
-        BACKENDS["file-4k-xfs"],
+        user_storage("file-512-ext4"),
+        user_storage("file-512-xfs"),
+        user_storage("file-4k-ext4"),
+        user_storage("file-4k-xfs"),
     ],
     ids=str
 )
@@ -33,37 +48,64 @@ def user_file(request):
         yield storage.Backend(backend)
 
 
-def test_debugging_interface(nbd_server):
-    nbd_server.start()
-    with nbd.open(nbd_server.url, "r+") as b:
-        assert b.readable()
-        assert b.writable()
-        assert not b.sparse
-        assert b.name == "nbd"
+@pytest.fixture(scope="module", params=["raw", "qcow2"])
+def shared_nbd_server(request, tmpdir_factory):
+    """
+    Return a started nbd server exporting an image in the requested format.
 
+    The server is shared by all tests in this module using the same format,
+    so tests using this server must not depend on the image content.
+    """
+    fmt = request.param
+    tmpdir = tmpdir_factory.mktemp("shared-nbd-" + fmt)
+    image = str(tmpdir.join("image"))
+    testutil.create_image(image, fmt, SHARED_IMAGE_SIZE)
 
-def test_open_read_write(nbd_server):
-    nbd_server.start()
-    with nbd.open(nbd_server.url, "r+") as b:
-        assert b.readable()
-        assert b.writable()
+    sock = UnixAddress(tmpdir.join("sock"))
+    server = qemu_nbd.Server(image, fmt, sock)
+    server.start()
+    try:
+        yield server
+    finally:
+        server.stop()
 
-        data = b"data"
-        b.write(data)
-        assert b.tell() == len(data)
 
-        b.zero(4)
-        size = len(data) + 4
-        assert b.tell() == size
+@pytest.fixture
+def nbd_backend(started_nbd_server):
+    """
+    Return a read write backend connected to a started nbd server.
+    """
+    with nbd.open(started_nbd_server.url, "r+") as b:
+        yield b
 
-        with closing(util.aligned_buffer(size)) as buf:
-            b.seek(0)
-            assert b.readinto(buf) == size
-            assert buf[:] == data + b"\0" * 4
-        b.flush()
 
+def test_debugging_interface(nbd_backend):
+    assert nbd_backend.readable()
+    assert nbd_backend.writable()
+    assert not nbd_backend.sparse
+    assert nbd_backend.name == "nbd"
+
+
+def test_open_read_write(nbd_backend, aligned_buffer_pool):
+    assert nbd_backend.readable()
+    assert nbd_backend.writable()
+
+    data = b"data"
+    nbd_backend.write(data)
+    assert nbd_backend.tell() == len(data)
+
+    nbd_backend.zero(4)
+    size = len(data) + 4
+    assert nbd_backend.tell() == size
+
+    with aligned_buffer_pool.get(size) as buf:
+        nbd_backend.seek(0)
+        assert nbd_backend.readinto(buf) == size
+        assert buf == b"data\0\0\0\0"
+    nbd_backend.flush()
 
-def test_open_readonly(nbd_server):
+
+def test_open_readonly(nbd_server, aligned_buffer_pool):
     nbd_server.read_only = True
     nbd_server.start()
     with nbd.open(nbd_server.url) as b:
@@ -78,17 +120,18 @@ def test_open_readonly(nbd_server):
             b.zero(4)
         assert b.tell() == 0
 
-        with closing(util.aligned_buffer(100)) as buf:
-            buf.write(b"x" * 100)
+        with aligned_buffer_pool.get(100) as buf:
+            # Pooled buffers are zeroed, so we must fill the buffer to detect
+            # a readinto() that did not read anything.
+            buf[:] = DATA_100
             assert b.readinto(buf) == len(buf)
-            assert buf[:] == b"\0" * len(buf)
+            assert ioutil.is_zero(buf)
 
         b.flush()
 
 
-def test_open_writeonly(nbd_server):
-    nbd_server.start()
-    with nbd.open(nbd_server.url, "w") as b:
+def test_open_writeonly(started_nbd_server, aligned_buffer_pool):
+    with nbd.open(started_nbd_server.url, "w") as b:
         assert not b.readable()
         assert b.writable()
 
@@ -97,16 +140,15 @@ def test_open_writeonly(nbd_server):
         assert b.tell() == len(data)
 
         with pytest.raises(IOError):
-            with closing(util.aligned_buffer(100)) as buf:
+            with aligned_buffer_pool.get(100) as buf:
                 b.readinto(buf)
 
         b.flush()
 
 
-def test_invalid_mode(nbd_server):
-    nbd_server.start()
+def test_invalid_mode(started_nbd_server):
     with pytest.raises(ValueError):
-        nbd.open(nbd_server.url, "invalid")
+        nbd.open(started_nbd_server.url, "invalid")
 
 
 @pytest.mark.parametrize("img_size,buf_size", [
@@ -114,14 +156,14 @@ def test_invalid_mode(nbd_server):
     pytest.param(4096, 8192, id="short-aligned"),
     pytest.param(4097, 8192, id="short-unaligned"),
 ])
-def test_readinto(nbd_server, img_size, buf_size):
+def test_readinto(nbd_server, aligned_buffer_pool, img_size, buf_size):
     with open(nbd_server.image, "wb") as f:
         f.write(b"x" * img_size)
 
     nbd_server.start()
 
-    buf = bytearray(buf_size)
-    with nbd.open(nbd_server.url, "r+") as f:
+    with nbd.open(nbd_server.url, "r+") as f, \
+            aligned_buffer_pool.get(buf_size) as buf:
         # When image size is not aligned to 512 bytes, the last read is
         # extended to the next multiple of 512.
         effective_size = f.size()
@@ -130,17 +172,16 @@ def test_readinto(nbd_server, img_size, buf_size):
         assert n == effective_size
         assert f.tell() == effective_size
         assert buf[:img_size] == b"x" * img_size
-        assert buf[img_size:] == b"\0" * (buf_size - img_size)
+        assert buf[img_size:] == bytes(buf_size - img_size)
 
 
 @pytest.mark.parametrize("end_offset", [
     pytest.param(0, id="at-end"),
     pytest.param(1, id="after-end"),
 ])
-def test_readinto_end(nbd_server, end_offset):
-    nbd_server.start()
+def test_readinto_end(started_nbd_server, end_offset):
     buf = bytearray(512)
-    with nbd.open(nbd_server.url, "r+") as f:
+    with nbd.open(started_nbd_server.url, "r+") as f:
         offset = f.size() + end_offset
         f.seek(offset)
         n = f.readinto(buf)
@@ -149,23 +190,22 @@ def test_readinto_end(nbd_server, end_offset):
 
 
 @pytest.mark.parametrize("sparse", [True, False])
-def test_zero_middle(nbd_server, sparse):
-    nbd_server.start()
-    with nbd.open(nbd_server.url, "r+", sparse=sparse) as b:
+def test_zero_middle(started_nbd_server, aligned_buffer_pool, sparse):
+    with nbd.open(started_nbd_server.url, "r+", sparse=sparse) as b:
         b.write(b"xxxxxxxxxxxx")
         b.seek(4)
         assert b.zero(4) == 4
 
-        with closing(util.aligned_buffer(12)) as buf:
+        with aligned_buffer_pool.get(12) as buf:
             b.seek(0)
             assert b.readinto(buf) == 12
-            assert buf[:] == b"xxxx\x00\x00\x00\x00xxxx"
+            assert buf == b"xxxx\x00\x00\x00\x00xxxx"
 
 
 @pytest.mark.parametrize("sparse", [True, False])
 def test_zero_sparse(nbd_server, user_file, sparse):
     size = 10 * 1024**2
-    qemu_img.create(user_file.path, "raw", size=size)
+    testutil.create_image(user_file.path, "raw", size)
     nbd_server.image = user_file.path
     nbd_server.start()
 
@@ -176,9 +216,8 @@ def test_zero_sparse(nbd_server, user_file, sparse):
         assert actual_size == 0 if sparse else b.size()
 
 
-def test_close(nbd_server):
-    nbd_server.start()
-    with nbd.open(nbd_server.url, "r+") as b:
+def test_close(started_nbd_server, aligned_buffer_pool):
+    with nbd.open(started_nbd_server.url, "r+") as b:
         pass
 
     # Closing twice does not do anything.
@@ -192,61 +231,85 @@ def test_close(nbd_server):
     assert str(e.value) == error
 
     with pytest.raises(ValueError) as e:
-        with closing(util.aligned_buffer(100)) as buf:
+        with aligned_buffer_pool.get(100) as buf:
             b.readinto(buf)
     assert str(e.value) == error
 
 
-def test_context_manager(nbd_server):
-    nbd_server.start()
-    with nbd.open(nbd_server.url, "r+") as b:
+def test_context_manager(started_nbd_server):
+    with nbd.open(started_nbd_server.url, "r+") as b:
         b.write(b"data")
     with pytest.raises(ValueError):
         b.write("more")
 
 
-def test_dirty(nbd_server):
-    nbd_server.start()
-    with nbd.open(nbd_server.url, "r+") as b:
-        # backend created clean
-        assert not b.dirty
+def test_dirty(nbd_backend, aligned_buffer_pool):
+    # backend created clean
+    assert not nbd_backend.dirty
 
-        # write and zero dirty the backend
-        b.write(b"01234")
-        assert b.dirty
+    # write and zero dirty the backend
+    nbd_backend.write(b"01234")
+    assert nbd_backend.dirty
 
-        b.flush()
-        assert not b.dirty
+    nbd_backend.flush()
+    assert not nbd_backend.dirty
 
-        b.zero(5)
-        assert b.dirty
+    nbd_backend.zero(5)
+    assert nbd_backend.dirty
 
-        b.flush()
-        assert not b.dirty
+    nbd_backend.flush()
+    assert not nbd_backend.dirty
 
-        # readinto, seek do not affect dirty.
-        b.seek(0)
-        assert not b.dirty
+    # readinto, seek do not affect dirty.
+    nbd_backend.seek(0)
+    assert not nbd_backend.dirty
 
-        with closing(util.aligned_buffer(10)) as buf:
-            b.readinto(buf)
-        assert not b.dirty
+    with aligned_buffer_pool.get(10) as buf:
+        nbd_backend.readinto(buf)
+    assert not nbd_backend.dirty
 
 
-@pytest.mark.parametrize("fmt", ["raw", "qcow2"])
-def test_size(nbd_server, fmt):
-    size = 150 * 1024**2
-    nbd_server.fmt = fmt
-    qemu_img.create(nbd_server.image, fmt, size=size)
-    nbd_server.start()
-    with nbd.open(nbd_server.url) as b:
-        assert b.size() == size
+def test_size(shared_nbd_server):
+    with nbd.open(shared_nbd_server.url) as b:
+        assert b.size() == SHARED_IMAGE_SIZE
+
+
+def test_extents_cached(shared_nbd_server, monkeypatch):
+    def fail(offset, length):
+        raise AssertionError("Unexpected block status command")
+
+    with nbd.open(shared_nbd_server.url) as b:
+        extents = list(b.extents())
+
+        # Read only backend reports cached extents.
+        monkeypatch.setattr(b._client, "extents", fail)
+        assert list(b.extents()) == extents
+
+        # Cloned backend reports the same cached extents.
+        with b.clone() as c:
+            monkeypatch.setattr(c._client, "extents", fail)
+            assert list(c.extents()) == extents
+
+
+def test_extents_not_cached(nbd_backend):
+    size = nbd_backend.size()
+    assert list(nbd_backend.extents()) == [
+        extent.ZeroExtent(0, size, True, False),
+    ]
+
+    # Writable backend reports the modified extents.
+    data = DATA_64K
+    nbd_backend.write(data)
+    assert list(nbd_backend.extents()) == [
+        extent.ZeroExtent(0, len(data), False, False),
+        extent.ZeroExtent(len(data), size - len(data), True, False),
+    ]
 
 
 @pytest.mark.parametrize("fmt", ["raw", "qcow2"])
 def test_extents_zero(nbd_server, user_file, fmt):
     size = 6 * 1024**3
-    qemu_img.create(user_file.path, fmt, size=size)
+    testutil.create_image(user_file.path, fmt, size)
 
     nbd_server.image = user_file.path
     nbd_server.fmt = fmt
@@ -254,12 +317,15 @@ def test_extents_zero(nbd_server, user_file, fmt):
 
     with nbd.open(nbd_server.url, "r+") as b:
         # qcow2 extents resolution is cluster size.
-        data = b"x" * 64 * 1024
+        data = DATA_64K
         b.write(data)
 
         # The second extent length is bigger than NBD maximum length, testing
         # that our extent length is not limited by NBD limits. The backend
         # sends multiple block status commands and merge the returned extents.
+        # The gap must not be zeroed: zeroing allocates zero clusters in qcow2
+        # images, so the gap would not be reported as a hole, and zeroing
+        # without punching holes may allocate space in raw images.
         b.seek(5 * 1024**3)
         b.write(data)
 
@@ -275,24 +341,14 @@ def test_extents_zero(nbd_server, user_file, fmt):
         ]
 
 
-@pytest.mark.parametrize("fmt", ["raw", "qcow2"])
-def test_extents_dirty_not_availabe(nbd_server, fmt):
-    qemu_img.create(nbd_server.image, fmt, 65536)
-    nbd_server.fmt = fmt
-    nbd_server.start()
-
-    with nbd.open(nbd_server.url, "r+", dirty=True) as b:
+def test_extents_dirty_not_availabe(shared_nbd_server):
+    with nbd.open(shared_nbd_server.url, "r+", dirty=True) as b:
         with pytest.raises(errors.UnsupportedOperation):
             list(b.extents(context="dirty"))
 
 
-@pytest.mark.parametrize("fmt", ["raw", "qcow2"])
-def test_clone(nbd_server, fmt):
-    qemu_img.create(nbd_server.image, fmt, 65536)
-    nbd_server.fmt = fmt
-    nbd_server.start()
-
-    with nbd.open(nbd_server.url, "r+") as a, \
+def test_clone(shared_nbd_server):
+    with nbd.open(shared_nbd_server.url, "r+") as a, \
             a.clone() as b:
         # Backends are indentical when created.
         assert a.size() == b.size()
@@ -300,10 +356,10 @@ def test_clone(nbd_server, fmt):
         assert a.block_size == b.block_size
 
         # Modifying one backend does not change the other.
-        a.write(b"x" * 4096)
+        a.write(DATA_4K)
         assert b.tell() == 0
 
         # Both backends expoose the same content.
         buf = bytearray(4096)
         b.readinto(buf)
-        assert buf == b"x" * 4096
+        assert buf == DATA_4K
@@ -16,6 +16,8 @@ from ovirt_imageio._internal import nbd
 from ovirt_imageio._internal import qemu_nbd
 from ovirt_imageio._internal import util
 
+from . import testutil
+
 # Mark tests with xfail if userstorage is missing
 userstorage.missing_handler = pytest.xfail
 
@@ -64,6 +66,34 @@ def nbd_server(tmpdir):
         server.stop()
 
 
+@pytest.fixture
+def started_nbd_server(nbd_server):
+    """
+    Returns a started nbd_server exporting a temporary file.
+
+    Use nbd_server if the test needs to configure the server before starting
+    it.
+    """
+    nbd_server.start()
+    return nbd_server
+
+
+@pytest.fixture(scope="session")
+def aligned_buffer_pool():
+    """
+    Return a pool of page aligned buffers shared by all tests.
+
+    Use aligned_buffer_pool.get(size) instead of util.aligned_buffer(size) to
+    reuse buffers between tests. The buffers are released when the session
+    ends.
+    """
+    pool = testutil.AlignedBufferPool()
+    try:
+        yield pool
+    finally:
+        pool.close()
+
+
 @pytest.fixture
 def base_image():
     path = "/var/tmp/imageio-images/cirros-0.3.5.img"
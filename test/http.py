@@ -8,6 +8,7 @@ http helpers.
 import errno
 import http.client
 import logging
+import os
 
 from pprint import pprint
 
@@ -22,6 +23,7 @@ class HTTPClient:
 
     def __init__(self, con):
         self.con = con
+        self._response = None
 
     def get(self, uri, headers=None):
         return self.request("GET", uri, headers=headers)
@@ -45,7 +47,38 @@ class HTTPClient:
             if not (e.errno == errno.EPIPE and body):
                 raise
             log.warning("Error sending request: %s", e)
-        return response(self.con)
+        self._response = response(self.con)
+        return self._response
+
+    def sendfile(self, method, uri, file, offset=0, count=None, headers=None):
+        """
+        Send a request with body from file, using socket.sendfile() to send
+        the data without copying it to user space when possible.
+
+        file must be a regular file opened in binary mode. If count is not
+        specified, send the data from offset to the end of the file.
+        """
+        if count is None:
+            count = os.fstat(file.fileno()).st_size - offset
+
+        self.con.putrequest(method, uri)
+        self.con.putheader("content-length", str(count))
+        if headers:
+            for name, value in headers.items():
+                self.con.putheader(name, value)
+        self.con.endheaders()
+
+        # socket.sendfile() does not accept count=0.
+        if count > 0:
+            try:
+                self.con.sock.sendfile(file, offset=offset, count=count)
+            except EnvironmentError as e:
+                if e.errno != errno.EPIPE:
+                    raise
+                log.warning("Error sending body: %s", e)
+
+        self._response = response(self.con)
+        return self._response
 
     def raw_request(self, method, uri, body=None, headers=None):
         """
@@ -66,7 +99,18 @@ class HTTPClient:
                 raise
             log.warning("Error sending body: %s", e)
 
-        return response(self.con)
+        self._response = response(self.con)
+        return self._response
+
+    def reset(self):
+        """
+        Read unread content of the last response, so the connection can be
+        reused for the next request. If the server closed the connection, it
+        will be opened again on the next request.
+        """
+        if self._response is not None:
+            self._response.read()
+            self._response = None
 
     def close(self):
         self.con.close()
@@ -1,12 +1,13 @@
 # SPDX-FileCopyrightText: Red Hat, Inc.
 # SPDX-License-Identifier: GPL-2.0-or-later
 
-import http.client as http_client
 import io
 import json
 import os
 import stat
 
+from http import HTTPStatus
+
 import pytest
 
 from ovirt_imageio._internal import config
@@ -15,6 +16,11 @@ from ovirt_imageio._internal import server
 from . import http
 from . import testutil
 
+GET_DATA = b"a" * 512 + b"b" * 512
+ZERO_DATA = b"x" * 512
+ZERO_MSG = {"op": "zero", "size": 20, "offset": 10, "future": True}
+ZERO_BODY = json.dumps(ZERO_MSG).encode("ascii")
+
 
 @pytest.fixture(scope="module")
 def srv():
@@ -27,24 +33,31 @@ def srv():
         s.stop()
 
 
-def test_method_not_allowed(srv):
+@pytest.fixture(scope="module")
+def client(srv):
     with http.LocalClient(srv.config) as c:
-        res = c.request("FOO", "/images/")
-        assert res.status == http_client.METHOD_NOT_ALLOWED
+        yield c
 
 
-@pytest.mark.parametrize("method", ["GET", "PUT", "PATCH"])
-def test_no_resource(srv, method):
-    with http.LocalClient(srv.config) as c:
-        res = c.request(method, "/no/resource")
-        assert res.status == http_client.NOT_FOUND
+@pytest.fixture(autouse=True)
+def reset_client(client):
+    yield
+    client.reset()
+
 
+def test_method_not_allowed(client):
+    res = client.request("FOO", "/images/")
+    assert res.status == HTTPStatus.METHOD_NOT_ALLOWED
 
+
+@pytest.mark.parametrize("uri,status", [
+    pytest.param("/no/resource", HTTPStatus.NOT_FOUND, id="no-resource"),
+    pytest.param("/images/", HTTPStatus.BAD_REQUEST, id="no-ticket-id"),
+])
 @pytest.mark.parametrize("method", ["GET", "PUT", "PATCH"])
-def test_no_ticket_id(srv, method):
-    with http.LocalClient(srv.config) as c:
-        res = c.request(method, "/images/")
-        assert res.status == http_client.BAD_REQUEST
+def test_invalid_uri(client, method, uri, status):
+    res = client.request(method, uri)
+    assert res.status == status
 
 
 @pytest.mark.parametrize("method,body", [
@@ -52,85 +65,102 @@ def test_no_ticket_id(srv, method):
     ("PUT", "body"),
     ("PATCH", json.dumps({"op": "flush"}).encode("ascii")),
 ])
-def test_no_ticket(srv, method, body):
-    with http.LocalClient(srv.config) as c:
-        res = c.request(method, "/images/no-ticket", body=body)
-        assert res.status == http_client.FORBIDDEN
+def test_no_ticket(client, method, body):
+    res = client.request(method, "/images/no-ticket", body=body)
+    assert res.status == HTTPStatus.FORBIDDEN
 
 
-def test_put_forbidden(srv):
-    ticket = testutil.create_ticket(
-        url="file:///no/such/image", ops=["read"])
+@pytest.mark.parametrize("method,ops,body,headers", [
+    pytest.param("PUT", ["read"], "content", None, id="put"),
+    pytest.param("GET", [], None, {"header": "content"}, id="get"),
+])
+def test_forbidden(srv, client, method, ops, body, headers):
+    ticket = testutil.create_ticket(url="file:///no/such/image", ops=ops)
     srv.auth.add(ticket)
-    with http.LocalClient(srv.config) as c:
-        res = c.put("/images/" + ticket["uuid"], "content")
-        assert res.status == http_client.FORBIDDEN
+    res = client.request(
+        method, "/images/" + ticket["uuid"], body=body, headers=headers)
+    assert res.status == HTTPStatus.FORBIDDEN
 
 
-def test_put(srv, tmpdir):
+def test_put(srv, client, tmpdir):
     data = b"-------|after"
     image = testutil.create_tempfile(tmpdir, "image", data)
     ticket = testutil.create_ticket(url="file://" + str(image))
     srv.auth.add(ticket)
     uri = "/images/" + ticket["uuid"]
-    with http.LocalClient(srv.config) as c:
-        res = c.put(uri, "content")
-        assert res.status == http_client.OK
-        assert res.getheader("content-length") == "0"
-        with io.open(str(image)) as f:
-            assert f.read(len(data)) == "content|after"
-
-
-def test_get_forbidden(srv):
-    ticket = testutil.create_ticket(
-        url="file:///no/such/image", ops=[])
+    res = client.put(uri, "content")
+    assert res.status == HTTPStatus.OK
+    assert res.getheader("content-length") == "0"
+    with io.open(str(image)) as f:
+        assert f.read(len(data)) == "content|after"
+
+
+@pytest.mark.parametrize("body,offset,count,expected", [
+    # Entire file.
+    (b"content", 0, None, "content|after"),
+    # Range in the middle of the file.
+    (b"xxcontentyy", 2, 7, "content|after"),
+    # Empty body.
+    (b"content", 0, 0, "-------|after"),
+])
+def test_put_sendfile(srv, client, tmpdir, body, offset, count, expected):
+    data = b"-------|after"
+    image = testutil.create_tempfile(tmpdir, "image", data)
+    body = testutil.create_tempfile(tmpdir, "body", body)
+    ticket = testutil.create_ticket(url="file://" + str(image))
     srv.auth.add(ticket)
-    with http.LocalClient(srv.config) as c:
-        res = c.get("/images/" + ticket["uuid"], {"header": "content"})
-        assert res.status == http_client.FORBIDDEN
+    uri = "/images/" + ticket["uuid"]
+    with io.open(str(body), "rb") as f:
+        res = client.sendfile("PUT", uri, f, offset=offset, count=count)
+    assert res.status == HTTPStatus.OK
+    assert res.getheader("content-length") == "0"
+    res.read()
+
+    # If the body does not match the content-length header, the next request
+    # on the same connection fails.
+    res = client.request("GET", uri, headers={"range": "bytes=0-12"})
+    assert res.status == HTTPStatus.PARTIAL_CONTENT
+    assert res.read() == expected.encode()
 
 
-def test_get(srv, tmpdir):
-    data = b"a" * 512 + b"b" * 512
+def test_get(srv, client, aligned_buffer_pool, tmpdir):
+    data = GET_DATA
     image = testutil.create_tempfile(tmpdir, "image", data)
     ticket = testutil.create_ticket(
         url="file://" + str(image), size=1024)
     srv.auth.add(ticket)
-    with http.LocalClient(srv.config) as c:
-        res = c.get("/images/" + ticket["uuid"])
-        assert res.status == http_client.OK
-        assert res.read() == data
+    res = client.get("/images/" + ticket["uuid"])
+    assert res.status == HTTPStatus.OK
+    with aligned_buffer_pool.get(len(data)) as buf:
+        assert res.readinto(buf) == len(data)
+        assert buf == data
 
 
-def test_images_zero(srv, tmpdir):
-    data = b"x" * 512
+def test_images_zero(srv, client, tmpdir):
+    data = ZERO_DATA
     image = testutil.create_tempfile(tmpdir, "image", data)
     ticket = testutil.create_ticket(url="file://" + str(image))
     srv.auth.add(ticket)
-    msg = {"op": "zero", "size": 20, "offset": 10, "future": True}
-    size = msg["size"]
-    offset = msg.get("offset", 0)
-    body = json.dumps(msg).encode("ascii")
-    with http.LocalClient(srv.config) as c:
-        res = c.patch("/images/" + ticket["uuid"], body)
-        assert res.status == http_client.OK
-        assert res.getheader("content-length") == "0"
-        with io.open(str(image), "rb") as f:
-            assert f.read(offset) == data[:offset]
-            assert f.read(size) == b"\0" * size
-            assert f.read() == data[offset + size:]
-
-
-def test_options(srv):
-    with http.LocalClient(srv.config) as c:
-        res = c.options("/images/*")
-        allows = {"OPTIONS", "GET", "PUT", "PATCH"}
-        features = {"checksum", "extents", "flush", "zero"}
-        assert res.status == http_client.OK
-        assert set(res.getheader("allow").split(',')) == allows
-        options = json.loads(res.read())
-        assert set(options["features"]) == features
-        assert options["unix_socket"] == srv.local_service.address
+    size = ZERO_MSG["size"]
+    offset = ZERO_MSG["offset"]
+    res = client.patch("/images/" + ticket["uuid"], ZERO_BODY)
+    assert res.status == HTTPStatus.OK
+    assert res.getheader("content-length") == "0"
+    image_data = image.read_binary()
+    assert image_data[:offset] == data[:offset]
+    assert image_data[offset:offset + size] == bytes(size)
+    assert image_data[offset + size:] == data[offset + size:]
+
+
+def test_options(srv, client):
+    res = client.options("/images/*")
+    allows = {"OPTIONS", "GET", "PUT", "PATCH"}
+    features = {"checksum", "extents", "flush", "zero"}
+    assert res.status == HTTPStatus.OK
+    assert set(res.getheader("allow").split(',')) == allows
+    options = json.loads(res.read())
+    assert set(options["features"]) == features
+    assert options["unix_socket"] == srv.local_service.address
 
 
 def test_control_socket_mode(srv):
@@ -92,7 +92,7 @@ def test_tcp_address_invalid(host, port):
 ])
 def test_handshake(tmpdir, export, fmt):
     image = str(tmpdir.join("image"))
-    create_image(image, fmt, 1024**3)
+    testutil.create_image(image, fmt, 1024**3)
     sock = nbd.UnixAddress(tmpdir.join("sock"))
 
     with qemu_nbd.run(image, fmt, sock, export_name=export):
@@ -162,12 +162,77 @@ def test_raw_write(tmpdir):
         assert f.read(len(data)) == data
 
 
+def test_raw_write_large(tmpdir):
+    # End to end check of a large write. Partial sends are tested in
+    # test_sendmsg_partial.
+    image = str(tmpdir.join("image"))
+    with open(image, "wb") as f:
+        f.truncate(1024**3)
+    sock = nbd.UnixAddress(tmpdir.join("sock"))
+    offset = 1024**2
+    data = b"x" * 8 * 1024**2
+
+    with qemu_nbd.run(image, "raw", sock):
+        with nbd.Client(sock) as c:
+            c.write(offset, memoryview(data))
+            c.flush()
+
+    with open(image, "rb") as f:
+        f.seek(offset)
+        assert f.read(len(data)) == data
+
+
+class FakeSocket:
+    """
+    Socket sending at most the next count from counts in every sendmsg()
+    call, simulating partial sends.
+    """
+
+    def __init__(self, counts):
+        self.counts = list(counts)
+        self.data = bytearray()
+
+    def sendmsg(self, buffers):
+        count = self.counts.pop(0)
+        sent = 0
+        for buf in buffers:
+            chunk = bytes(buf[:count - sent])
+            self.data += chunk
+            sent += len(chunk)
+            if sent == count:
+                break
+        return sent
+
+
+@pytest.mark.parametrize("counts", [
+    # Everything sent in one call.
+    pytest.param([20], id="complete"),
+    # Split in the middle of the first buffer, then send the rest of the
+    # first buffer, skip the empty buffer, and split in the middle of the
+    # third buffer.
+    pytest.param([4, 5, 7, 4], id="split-buffers"),
+    # Ending exactly at the end of buffer followed by empty buffer.
+    pytest.param([6, 10, 4], id="buffer-boundary"),
+    # One byte at a time.
+    pytest.param([1] * 20, id="byte-by-byte"),
+])
+def test_sendmsg_partial(counts):
+    sock = FakeSocket(counts)
+    c = nbd.Client.__new__(nbd.Client)
+    c._sock = sock
+
+    c._sendmsg(b"header", b"", bytearray(b"0123456789"), memoryview(b"tail"))
+
+    assert sock.data == b"header0123456789tail"
+    assert sock.counts == []
+
+
 def test_qcow2_write_read(tmpdir):
     image = str(tmpdir.join("image"))
     sock = nbd.UnixAddress(tmpdir.join("sock"))
     offset = 1024**2
     data = b"can read and write qcow2"
-    create_image(image, "qcow2", 1024**3)
+    testutil.create_image(image, "qcow2", 1024**3)
 
     with qemu_nbd.run(image, "qcow2", sock):
         with nbd.Client(sock) as c:
@@ -184,7 +249,7 @@ def test_zero(tmpdir, fmt):
     offset = 1024**2
     image = str(tmpdir.join("image"))
     sock = nbd.UnixAddress(tmpdir.join("sock"))
-    create_image(image, fmt, size)
+    testutil.create_image(image, fmt, size)
 
     with qemu_nbd.run(image, fmt, sock):
         # Fill image with data
@@ -206,7 +271,7 @@ def test_zero_max_block_size(tmpdir, fmt):
     offset = 1024**2
     image = str(tmpdir.join("image"))
     sock = nbd.UnixAddress(tmpdir.join("sock"))
-    create_image(image, fmt, 1024**3)
+    testutil.create_image(image, fmt, 1024**3)
 
     with qemu_nbd.run(image, fmt, sock):
         # Fill range with data
@@ -229,7 +294,7 @@ def test_zero_min_block_size(tmpdir, fmt):
     offset = 1024**2
     image = str(tmpdir.join("image"))
     sock = nbd.UnixAddress(tmpdir.join("sock"))
-    create_image(image, fmt, 1024**3)
+    testutil.create_image(image, fmt, 1024**3)
 
     with qemu_nbd.run(image, fmt, sock):
         # Fill range with data
@@ -333,7 +398,7 @@ if qemu_nbd.version() >= (6, 0, 0):
 @pytest.mark.parametrize("fmt,hole_flags", FMT_HOLE_FLAGS_PARAMS)
 def test_base_allocation_empty(nbd_server, user_file, fmt, hole_flags):
     size = 1024**3
-    create_image(user_file.path, fmt, size)
+    testutil.create_image(user_file.path, fmt, size)
 
     nbd_server.image = user_file.path
     nbd_server.fmt = fmt
@@ -372,7 +437,7 @@ def test_base_allocation_empty(nbd_server, user_file, fmt, hole_flags):
 @pytest.mark.parametrize("fmt", ["raw", "qcow2"])
 def test_base_allocation_full(nbd_server, user_file, fmt):
     size = 1024**2
-    create_image(user_file.path, fmt, size)
+    testutil.create_image(user_file.path, fmt, size)
 
     nbd_server.image = user_file.path
     nbd_server.fmt = fmt
@@ -413,7 +478,7 @@ def test_base_allocation_full(nbd_server, user_file, fmt):
 @pytest.mark.parametrize("fmt,hole_flags", FMT_HOLE_FLAGS_PARAMS)
 def test_base_allocation_some_data(nbd_server, user_file, fmt, hole_flags):
     size = 1024**3
-    create_image(user_file.path, fmt, size)
+    testutil.create_image(user_file.path, fmt, size)
 
     nbd_server.image = user_file.path
     nbd_server.fmt = fmt
@@ -443,7 +508,7 @@ def test_base_allocation_some_data(nbd_server, user_file, fmt, hole_flags):
 def test_base_allocation_some_data_unaligned(
         nbd_server, user_file, fmt, hole_flags):
     size = 1024**2
-    create_image(user_file.path, fmt, size)
+    testutil.create_image(user_file.path, fmt, size)
 
     nbd_server.image = user_file.path
     nbd_server.fmt = fmt
@@ -490,7 +555,7 @@ def test_base_allocation_many_extents(nbd_server, user_file):
     extents_count = 2000
 
     size = extents_count * extent_length
-    create_image(user_file.path, "raw", size)
+    testutil.create_image(user_file.path, "raw", size)
 
     nbd_server.image = user_file.path
     nbd_server.fmt = "raw"
@@ -517,7 +582,7 @@ def test_extents_reply_error(nbd_server, user_file):
     request including one or more sectors beyond the size of the device.
     """
     size = 1024**2
-    create_image(user_file.path, "raw", size)
+    testutil.create_image(user_file.path, "raw", size)
 
     nbd_server.image = user_file.path
     nbd_server.fmt = "raw"
@@ -540,7 +605,7 @@ def test_extents_reply_error(nbd_server, user_file):
 @pytest.mark.parametrize("fmt", ["raw", "qcow2"])
 def test_full_backup_handshake(tmpdir, fmt, nbd_sock):
     image = str(tmpdir.join("image"))
-    create_image(image, fmt, 1024**3)
+    testutil.create_image(image, fmt, 1024**3)
 
     with backup.full_backup(tmpdir, image, fmt, nbd_sock):
         with nbd.Client(nbd_sock, "sda") as c:
@@ -568,7 +633,7 @@ def test_full_backup_single_image(tmpdir, user_file, fmt, nbd_sock):
     disk_size = 5 * chunk_size
 
     # Create disk
-    create_image(user_file.path, fmt, disk_size)
+    testutil.create_image(user_file.path, fmt, disk_size)
 
     # Pupulate disk with data.
     with qemu_nbd.open(user_file.path, fmt) as d:
@@ -824,14 +889,3 @@ def test_reply_error_unknown_code():
 def test_reply_error_empty_message():
     s = str(nbd.ReplyError(5, ""))
     assert s == "Server error: [Error 5] Input/output error"
-
-
-def create_image(path, fmt, size):
-    if fmt == "raw":
-        # qemu-img allocates the first block on Fedora, but not on CentOS 8.0.
-        # Allocate manually for consistent results.
-        # TODO: Use qemu-img when we have CentOS 8.1 AV.
-        with io.open(path, "wb") as f:
-            f.truncate(size)
-    else:
-        qemu_img.create(path, "qcow2", size=size)
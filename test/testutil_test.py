@@ -1,10 +1,14 @@
 # SPDX-FileCopyrightText: Red Hat, Inc.
 # SPDX-License-Identifier: GPL-2.0-or-later
 
+import ctypes
+import os
 import socket
 
 from contextlib import closing
 
+import pytest
+
 from . import testutil
 
 
@@ -35,3 +39,46 @@ def test_create_tempfile_data_and_size(tmpdir):
     file = testutil.create_tempfile(
         tmpdir, "image", data=b"x" * data_size, size=virtual_size)
     assert file.read() == "x" * data_size + "\0" * (virtual_size - data_size)
+
+
+def test_create_image_raw(tmpdir):
+    path = str(tmpdir.join("image"))
+    testutil.create_image(path, "raw", 1024**3)
+    st = os.stat(path)
+    assert st.st_size == 1024**3
+    assert st.st_blocks == 0
+
+
+def test_aligned_buffer_pool_reuse():
+    pool = testutil.AlignedBufferPool()
+    try:
+        with pool.get(100) as buf:
+            assert len(buf) == 100
+            buf[:] = b"x" * 100
+            addr = ctypes.addressof(ctypes.c_char.from_buffer(buf))
+
+        # Same bucket, buffer is reused and cleared.
+        with pool.get(512) as buf:
+            assert len(buf) == 512
+            assert buf == bytes(512)
+            assert ctypes.addressof(ctypes.c_char.from_buffer(buf)) == addr
+    finally:
+        pool.close()
+
+
+@pytest.mark.parametrize("size,bucket", [
+    (1, 512),
+    (512, 512),
+    (513, 4096),
+    (8192, 8192),
+    (8193, 1024**2),
+    (1024**2 + 1, 2 * 1024**2),
+])
+def test_aligned_buffer_pool_bucket(size, bucket):
+    pool = testutil.AlignedBufferPool()
+    try:
+        with pool.get(size) as buf:
+            assert len(buf) == size
+        assert [len(b) for b in pool._free[bucket]] == [bucket]
+    finally:
+        pool.close()